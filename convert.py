@@ -2,7 +2,11 @@
 GPX converter for vpohid.com.ua JSON exports.
 
 Features:
-- Reads data either from a local JSON file or from a URL.
+- Reads data either from a local JSON file or from one or more URLs
+  (several URLs are downloaded concurrently and merged). URL responses with
+  an ETag are cached on disk and revalidated on the next run.
+- Streams items with ijson when it is installed (bounded memory on large
+  exports); otherwise parses the whole document with orjson or json.
 - Supports three input JSON shapes: a plain list of items, an object with "items",
   or an object with "response.items".
 - Produces GPX 1.1; optionally adds OsmAnd extensions (icon, color, background).
@@ -13,12 +17,45 @@ Configuration is provided via CLI flags only (with built-in defaults).
 from __future__ import annotations
 
 import argparse
-import html
+import base64
+import contextlib
+import functools
+import gzip
+import hashlib
+import http.client
+import io
+import itertools
 import json
+import os
+import shutil
+import socket
+import ssl
+import stat
 import sys
-from typing import Any, Dict, List
-from urllib.error import HTTPError, URLError
-from urllib.request import urlopen
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+try:
+    # Optional streaming parser; prefer the C (yajl2) backend when available.
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+try:
+    # Optional fast parser for the eager path; takes bytes, decodes UTF-8 in C.
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 # --- CONSTANTS ---
 
@@ -62,14 +99,81 @@ KIND_TO_COLOR: Dict[str, str] = {
 DEFAULT_COLOR = "#4A4A4A"
 
 
-def build_config_from_env_and_args() -> Dict[str, Any]:
-    """Build runtime config from CLI only (with defaults).
+def _make_ext_block(icon_name: str, color_hex: str) -> str:
+    """Return the OsmAnd <extensions> block for the given icon and color."""
+    return (
+        "    <extensions>\n"
+        f"      <osmand:icon>{icon_name}</osmand:icon>\n"
+        f"      <osmand:color>{color_hex}</osmand:color>\n"
+        "      <osmand:background>circle</osmand:background>\n"
+        "    </extensions>\n"
+    )
 
-    Returns a dict with keys: use_osmand_tags, use_single_group_name,
-    group_name, input_json, input_url, output_gpx.
-    If neither input_json nor input_url is provided, defaults to my_places.json.
-    If output_gpx is empty, generates a name based on OsmAnd flag.
-    """
+
+# Pre-rendered OsmAnd <extensions> blocks per kind (kinds are a small fixed set).
+KIND_TO_EXT_BLOCK: Dict[str, str] = {
+    kind: _make_ext_block(
+        KIND_TO_OSMAND_ICON.get(kind, DEFAULT_ICON),
+        KIND_TO_COLOR.get(kind, DEFAULT_COLOR),
+    )
+    for kind in KIND_TO_OSMAND_ICON.keys() | KIND_TO_COLOR.keys()
+}
+# Block for kinds missing from the mappings above.
+DEFAULT_EXT_BLOCK = _make_ext_block(DEFAULT_ICON, DEFAULT_COLOR)
+
+# ijson prefixes of the arrays holding items, for the supported JSON shapes.
+# If several are present, the one that starts first in the document is used.
+ITEMS_PREFIXES = ("", "response.items", "items")
+# Bytes read ahead to detect the JSON shape before streaming.
+SHAPE_PEEK_SIZE = 1 << 16
+
+# Exceptions raised by the available JSON parsers on malformed input
+# (orjson.JSONDecodeError subclasses json.JSONDecodeError).
+JSON_ERRORS: Tuple[Type[Exception], ...] = (json.JSONDecodeError,)
+if ijson is not None:
+    JSON_ERRORS += (ijson.common.JSONError,)
+
+# Timeout (seconds) for HTTP requests.
+HTTP_TIMEOUT = 20
+# Retries for network errors (not HTTP error statuses) and the base backoff
+# delay in seconds, doubled after each attempt.
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.2
+# Network errors that fail at once: a retry cannot fix TLS/certificate errors,
+# and each timeout has already cost HTTP_TIMEOUT seconds.
+HTTP_NO_RETRY_ERRORS: Tuple[Type[Exception], ...] = (ssl.SSLError, socket.timeout)
+# Headers sent with every HTTP request.
+HTTP_HEADERS: Dict[str, str] = {
+    "User-Agent": "vpohid-gpx-converter/1.0",
+    # JSON with repeated keys compresses well; the body is inflated while parsed.
+    "Accept-Encoding": "gzip",
+}
+# Redirects followed per request, and the statuses that count as redirects.
+HTTP_MAX_REDIRECTS = 5
+HTTP_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+
+# Per-user directory for cached URL responses (validated with ETag on each
+# run), created under $XDG_CACHE_HOME or ~/.cache.
+CACHE_DIR_NAME = "vpohid-gpx-converter"
+
+# Upper bound on concurrent downloads when several URLs are given.
+MAX_FETCH_WORKERS = 10
+
+# Output file buffer size: small writes are batched into large blocks.
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Process umask for the mode of newly created output files. os.umask can only
+# be read by setting it, so this is done once at import, not per conversion.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+UNSUPPORTED_FORMAT_MSG = (
+    "Непідтримуваний формат JSON: очікується масив або об'єкт з 'response.items'."
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the CLI argument parser (once per process)."""
     defaults = {"use_osmand_tags": True}
 
     parser = argparse.ArgumentParser(
@@ -89,9 +193,26 @@ def build_config_from_env_and_args() -> Dict[str, Any]:
     parser.add_argument(
         "-u",
         "--url",
-        dest="input_url",
+        dest="input_urls",
+        action="append",
         help=(
-            "URL з JSON-відповіддю (поля у response.items)"
+            "URL з JSON-відповіддю (поля у response.items). "
+            "Можна вказати кілька разів — точки об'єднуються в один файл"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Не використовувати кеш завантажених URL (завжди завантажувати заново)",
+    )
+    parser.add_argument(
+        "--eager",
+        dest="eager",
+        action="store_true",
+        help=(
+            "Читати весь JSON одразу замість потокового розбору "
+            "(швидше для невеликих файлів, потребує більше пам'яті)"
         ),
     )
     parser.add_argument(
@@ -122,53 +243,157 @@ def build_config_from_env_and_args() -> Dict[str, Any]:
             "Назва єдиної групи. Якщо не вказано — групування за типом (kind)"
         ),
     )
+    return parser
+
+
+@dataclass(frozen=True)
+class Config:
+    """Runtime configuration of a conversion run."""
+
+    use_osmand_tags: bool
+    use_single_group_name: bool
+    group_name: str
+    input_json: str
+    input_urls: Tuple[str, ...]
+    use_cache: bool
+    eager: bool
+    output_gpx: str
+    base_url: str = BASE_URL
 
-    args = parser.parse_args()
+
+def build_config_from_env_and_args() -> Config:
+    """Build runtime config from CLI only (with defaults).
+
+    If neither input_json nor input_urls is provided, defaults to my_places.json.
+    If output_gpx is empty, generates a name based on OsmAnd flag.
+    """
+    args = _build_parser().parse_args()
 
     use_single = args.group_name is not None and args.group_name.strip() != ""
-    cfg: Dict[str, Any] = {
-        "use_osmand_tags": args.use_osmand_tags,
-        "use_single_group_name": use_single,
-        "group_name": (args.group_name.strip() if use_single else ""),
-        "input_json": args.input_json or "",
-        "input_url": args.input_url or "",
-        "output_gpx": args.output_gpx or "",
-    }
+    input_json = args.input_json or ""
+    input_urls = tuple(args.input_urls or ())
 
     # If no source provided — use default file
-    if not cfg.get("input_json") and not cfg.get("input_url"):
-        cfg["input_json"] = "my_places.json"
+    if not input_json and not input_urls:
+        input_json = "my_places.json"
 
     # If output file is not set — generate the name automatically
-    if not cfg["output_gpx"]:
-        cfg["output_gpx"] = (
-            "converted_places_"
-            f"{'osmand' if cfg['use_osmand_tags'] else 'standard'}.gpx"
-        )
+    output_gpx = args.output_gpx or (
+        "converted_places_"
+        f"{'osmand' if args.use_osmand_tags else 'standard'}.gpx"
+    )
 
-    return cfg
+    return Config(
+        use_osmand_tags=args.use_osmand_tags,
+        use_single_group_name=use_single,
+        group_name=(args.group_name.strip() if use_single else ""),
+        input_json=input_json,
+        input_urls=input_urls,
+        use_cache=args.use_cache,
+        eager=args.eager,
+        output_gpx=output_gpx,
+    )
 
 
 def _extract_items(ob: Any) -> List[Dict[str, Any]]:
     """Return a list of items from possible JSON shapes.
 
     - If it's an array — return it as a list of dicts.
-    - If it's an object with response.items — return that list.
-    - If it's an object with items — return that list.
+    - If it's an object with response.items and/or items lists — return the
+      one that comes first in the document (key order), which is the array
+      the streaming parser picks too.
     Otherwise, raise ValueError.
     """
     if isinstance(ob, list):
         return ob  # type: ignore[return-value]
     if isinstance(ob, dict):
-        if isinstance(ob.get("response"), dict) and isinstance(
-            ob["response"].get("items"), list
-        ):
-            return ob["response"]["items"]  # type: ignore[return-value]
-        if isinstance(ob.get("items"), list):
-            return ob["items"]  # type: ignore[return-value]
-    raise ValueError(
-        "Непідтримуваний формат JSON: очікується масив або об'єкт з 'response.items'."
-    )
+        for key, value in ob.items():
+            if key == "response" and isinstance(value, dict):
+                value = value.get("items")
+            elif key != "items":
+                continue
+            if isinstance(value, list):
+                return value  # type: ignore[return-value]
+    raise ValueError(UNSUPPORTED_FORMAT_MSG)
+
+
+class _ReplayReader:
+    """Binary reader that returns already-read head bytes before the rest of fp."""
+
+    def __init__(self, head: bytes, fp: IO[bytes]) -> None:
+        self._head = head
+        self._fp = fp
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._fp.read(size)
+        if size < 0:
+            data, self._head = self._head + self._fp.read(), b""
+        else:
+            data, self._head = self._head[:size], self._head[size:]
+        return data
+
+
+def _detect_items_prefix(head: bytes) -> Optional[str]:
+    """Return the ijson prefix of the items array (one of ITEMS_PREFIXES).
+
+    The first matching array in document order wins. Only the beginning of the document is inspected; returns None if the
+    array does not start within ``head``.
+    """
+    try:
+        for prefix, event, _ in ijson.parse(io.BytesIO(head)):
+            if event == "start_array" and prefix in ITEMS_PREFIXES:
+                return prefix
+    except ijson.common.JSONError:
+        pass  # head ends mid-document
+    return None
+
+
+def _iter_items_stream(fp: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    """Yield items one by one from a binary JSON stream using ijson.
+
+    The shape is detected once from the first SHAPE_PEEK_SIZE bytes and the
+    stream is handed to ijson.items with the matching prefix. If the items
+    array starts further on, parser events are scanned up to it instead.
+    Closes fp when done.
+    """
+    with fp:
+        head = fp.read(SHAPE_PEEK_SIZE)
+        stream = _ReplayReader(head, fp)
+        prefix = _detect_items_prefix(head)
+        if prefix is not None:
+            item_prefix = f"{prefix}.item" if prefix else "item"
+            yield from ijson.items(stream, item_prefix, use_float=True)
+            return
+
+        events = ijson.parse(stream, use_float=True)
+        for prefix, event, value in events:
+            if event == "start_array" and prefix in ITEMS_PREFIXES:
+                break
+        else:
+            raise ValueError(UNSUPPORTED_FORMAT_MSG)
+        item_prefix = f"{prefix}.item" if prefix else "item"
+        yield from ijson.items(
+            itertools.chain([(prefix, event, value)], events), item_prefix
+        )
+
+
+def _esc(text: str) -> str:
+    """Escape a string for use as XML element text (&, < and >).
+
+    Most texts need no escaping, so a cheap membership check comes first;
+    str.replace is much faster than str.translate on non-ASCII text.
+    """
+    if "&" in text or "<" in text or ">" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text
+
+
+def _esc_attr(value: str) -> str:
+    """Escape a string for use inside a double-quoted XML attribute."""
+    if "&" in value or "<" in value or ">" in value or '"' in value:
+        return _esc(value).replace('"', "&quot;")
+    return value
 
 
 def _make_gpx_header(use_osmand_tags: bool) -> str:
@@ -188,107 +413,470 @@ def _make_gpx_header(use_osmand_tags: bool) -> str:
     return header
 
 
-def _load_data(input_json_file: str, input_url: str) -> List[Dict[str, Any]]:
-    """Loads data from a file or URL and returns a list of items."""
-    data_obj: Any
-    if input_url:
+class _GzipResponse(gzip.GzipFile):
+    """Decompressing reader over an HTTP response; also closes the response."""
+
+    def __init__(self, resp: IO[bytes]) -> None:
+        super().__init__(fileobj=resp)
+        self._resp = resp
+
+    def close(self) -> None:
         try:
-            with urlopen(input_url, timeout=20) as resp:
-                charset = resp.headers.get_content_charset() or "utf-8"
-                text = resp.read().decode(charset, errors="replace")
-                data_obj = json.loads(text)
-        except HTTPError as e:
-            raise RuntimeError(
-                f"HTTP помилка {e.code} при завантаженні URL: {input_url}"
-            ) from e
-        except URLError as e:
-            raise RuntimeError(
-                f"Помилка мережі при завантаженні URL: {e.reason}"
-            ) from e
-    else:
-        with open(input_json_file, "r", encoding="utf-8") as f:
-            data_obj = json.load(f)
-    return _extract_items(data_obj)
+            super().close()
+        finally:
+            self._resp.close()
 
 
-def _make_wpt(place: Dict[str, Any], cfg: Dict[str, Any], base_url: str) -> str:
-    """Build a GPX <wpt> element for a single place.
+# A pooled connection with the request-target style and extra headers of its
+# route: (connection, absolute_target, extra_headers).
+_Connection = Tuple[http.client.HTTPConnection, bool, Dict[str, str]]
 
-    Uses fields: latitude, longitude (required), sealevel-><ele>, whenadded-><time>,
-    title-><name>, description-><desc>, kind-><type> (or a single group name from cfg),
-    viewurl to append a link (with base_url). When OsmAnd is enabled, adds icon/color/background
-    and a clickable link inside <extensions>.
-    Returns an empty string if lat/lon are missing.
-    """
-    lat, lon = place.get("latitude"), place.get("longitude")
-    if lat is None or lon is None:
-        return ""
+# Idle keep-alive connections shared by all threads, keyed by (scheme, netloc).
+# A connection is checked out for one request and put back once its response
+# body has been read to the end, so later fetches in the process (other worker
+# threads, or further conversions in a batch driver) skip the TCP/TLS setup.
+_idle_connections: Dict[Tuple[str, str], List[_Connection]] = {}
+_idle_lock = threading.Lock()
 
-    parts: List[str] = [f'  <wpt lat="{lat}" lon="{lon}">']
 
-    if place.get("sealevel"):
-        parts.append(f'    <ele>{place["sealevel"]}</ele>')
-    if place.get("whenadded"):
-        parts.append(
-            f'    <time>{place["whenadded"].replace(" ", "T")}Z</time>'
-        )
-    if place.get("title"):
-        parts.append(f'    <name>{html.escape(place["title"])}</name>')
-
-    description_content = place.get("description", "")
-    if place.get("viewurl"):
-        full_url = f"{base_url}{place['viewurl']}"
-        description_content += (
-            f'<br/><br/><a href="{full_url}">Детальніше</a>'
+def _new_connection(scheme: str, netloc: str) -> _Connection:
+    """Create a (not yet connected) connection to a host.
+
+    Honours the *_proxy environment variables (plain-http proxies): https is
+    tunnelled through the proxy with CONNECT, http sends absolute URLs to it.
+    """
+    parts = urlsplit(f"{scheme}://{netloc}")
+    host, port = parts.hostname or "", parts.port
+    conn_class = (
+        http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    )
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(host):
+        return conn_class(host, port, timeout=HTTP_TIMEOUT), False, {}
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    proxy_parts = urlsplit(proxy)
+    extra: Dict[str, str] = {}
+    if proxy_parts.username:
+        creds = f"{unquote(proxy_parts.username)}:{unquote(proxy_parts.password or '')}"
+        extra["Proxy-Authorization"] = (
+            f"Basic {base64.b64encode(creds.encode('utf-8')).decode('ascii')}"
         )
-    if description_content:
-        parts.append(f"    <desc>{html.escape(description_content)}</desc>")
+    conn = conn_class(proxy_parts.hostname, proxy_parts.port, timeout=HTTP_TIMEOUT)
+    if scheme == "https":
+        conn.set_tunnel(host, port, headers=extra)
+        return conn, False, {}
+    return conn, True, extra
+
+
+def _checkout_connection(scheme: str, netloc: str) -> _Connection:
+    """Take an idle connection to a host from the pool, or create a new one."""
+    with _idle_lock:
+        idle = _idle_connections.get((scheme, netloc))
+        if idle:
+            return idle.pop()
+    return _new_connection(scheme, netloc)
+
+
+def _release_connection(scheme: str, netloc: str, entry: _Connection) -> None:
+    """Return a connection whose last response was fully read to the pool."""
+    conn = entry[0]
+    if conn.sock is None:  # the server asked to close it
+        return
+    with _idle_lock:
+        idle = _idle_connections.setdefault((scheme, netloc), [])
+        if len(idle) < MAX_FETCH_WORKERS:
+            idle.append(entry)
+            return
+    conn.close()
+
+
+class _PooledResponse(io.BufferedIOBase):
+    """Body reader over a keep-alive response.
+
+    Closing it after the body is fully read returns the connection to the
+    pool; closing it earlier closes the connection, so unread bytes never
+    leak into the next request on it.
+    """
+
+    def __init__(
+        self,
+        resp: http.client.HTTPResponse,
+        key: Tuple[str, str],
+        entry: _Connection,
+    ) -> None:
+        super().__init__()
+        self._resp = resp
+        self._key = key
+        self._entry = entry
+        self.status = resp.status
+        self.headers = resp.headers
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._resp.read(None if size is None or size < 0 else size)
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._resp.isclosed():
+                _release_connection(*self._key, self._entry)
+            else:
+                self._resp.close()
+                self._entry[0].close()
+        super().close()
+
+
+def _send(
+    conn: http.client.HTTPConnection, target: str, headers: Dict[str, str]
+) -> http.client.HTTPResponse:
+    """Sends a GET on conn and returns the response; closes conn on failure."""
+    try:
+        conn.request("GET", target, headers=headers)
+        return conn.getresponse()
+    except BaseException:
+        conn.close()
+        raise
 
-    if cfg["use_single_group_name"] and cfg["group_name"]:
-        parts.append(f"    <type>{html.escape(cfg['group_name'])}</type>")
-    elif place.get("kind"):
-        parts.append(f"    <type>{html.escape(place['kind'])}</type>")
 
-    if place.get("viewurl"):
-        parts.append(
-            f'    <link href="{base_url}{place["viewurl"]}"><text>Детальніше</text></link>'
-        )
-    if cfg["use_osmand_tags"]:
-        parts.append("    <extensions>")
-        kind = place.get("kind", "")
-        icon_name = KIND_TO_OSMAND_ICON.get(kind, DEFAULT_ICON)
-        color_hex = KIND_TO_COLOR.get(kind, DEFAULT_COLOR)
-        parts.append(f"      <osmand:icon>{icon_name}</osmand:icon>")
-        parts.append(f"      <osmand:color>{color_hex}</osmand:color>")
-        parts.append("      <osmand:background>circle</osmand:background>")
-        parts.append("    </extensions>")
+def _request(url: str, headers: Dict[str, str]) -> _PooledResponse:
+    """Sends a GET over a pooled keep-alive connection, following redirects.
 
-    parts.append("  </wpt>")
-    return "\n".join(parts)
+    A request whose pooled connection turns out to be closed by the server
+    (ConnectionError on an idle socket) is sent once more on a fresh one;
+    other network errors propagate as OSError / http.client.HTTPException.
+    """
+    for _ in range(HTTP_MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise RuntimeError(f"Непідтримувана схема URL: {url}")
+        key = (parts.scheme, parts.netloc)
+        entry = _checkout_connection(*key)
+        conn, absolute_target, extra = entry
+        target = url if absolute_target else (parts.path or "/")
+        if parts.query and not absolute_target:
+            target += f"?{parts.query}"
+        request_headers = {**HTTP_HEADERS, **extra, **headers}
+        reused = conn.sock is not None
+        try:
+            resp = _send(conn, target, request_headers)
+        except ConnectionError:
+            if not reused:
+                raise
+            resp = _send(conn, target, request_headers)
+        location = resp.getheader("Location")
+        if resp.status not in HTTP_REDIRECT_STATUSES or not location:
+            return _PooledResponse(resp, key, entry)
+        resp.read()
+        _release_connection(*key, entry)
+        url = urljoin(url, location)
+    raise RuntimeError(f"Забагато перенаправлень при завантаженні URL: {url}")
+
+
+def _cache_dir() -> Path:
+    """Return the per-user cache directory, creating it (mode 0700) if needed."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    path = Path(base) / CACHE_DIR_NAME
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return path
 
 
-def convert_places_to_gpx(cfg: Dict[str, Any]) -> int:
-    """Converts data from a file or URL to GPX. Returns the number of converted points."""
-    input_json_file = cfg.get("input_json") or ""
-    input_url = cfg.get("input_url") or ""
-    output_gpx_file = cfg["output_gpx"]
-    base_url = BASE_URL.rstrip("/")
+def _cache_paths(url: str) -> Tuple[Path, Path]:
+    """Return (body, etag) cache file paths for a URL."""
+    key = hashlib.blake2b(url.encode("utf-8"), digest_size=8).hexdigest()
+    body_path = _cache_dir() / f"{key}.json"
+    return body_path, body_path.with_suffix(".etag")
 
-    gpx_parts: List[str] = [_make_gpx_header(cfg["use_osmand_tags"])]
 
-    data = _load_data(input_json_file, input_url)
+def _write_atomic(path: Path, src: IO[bytes]) -> None:
+    """Copies a stream into path via a temp file in the same dir and os.replace."""
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            shutil.copyfileobj(src, tmp)
+        os.replace(tmp_name, str(path))
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
+
+def _save_to_cache(
+    url: str, body: IO[bytes], etag: str, body_path: Path, etag_path: Path
+) -> IO[bytes]:
+    """Stores a response body and its ETag; returns the body read back from cache.
+
+    Both files are replaced atomically, and the old ETag is removed first, so
+    a body is never paired with a stale ETag. The cache is best-effort: if the
+    directory is not writable the response is streamed as is, and if writing
+    fails midway the URL is fetched again without the cache.
+    """
+    if not os.access(str(body_path.parent), os.W_OK):
+        return body
+    with body:
+        try:
+            with contextlib.suppress(FileNotFoundError):
+                etag_path.unlink()
+            _write_atomic(body_path, body)
+            _write_atomic(etag_path, io.BytesIO(etag.encode("utf-8")))
+            return open(body_path, "rb")
+        except OSError:
+            pass
+    return _open_url(url, use_cache=False)
+
+
+def _open_url(url: str, use_cache: bool = True) -> IO[bytes]:
+    """Opens a URL and returns a binary file-like object with the (inflated) body.
+
+    Network errors are retried HTTP_RETRIES times with exponential backoff;
+    HTTP error statuses, TLS errors and timeouts are not. With use_cache, responses that carry an ETag
+    are stored in the per-user cache directory and revalidated with
+    If-None-Match; on 304 the cached body is returned. Cache I/O errors are
+    treated as a cache miss.
+    """
+    headers: Dict[str, str] = {}
+    cache: Optional[Tuple[Path, Path]] = None
+    if use_cache:
+        try:
+            cache = _cache_paths(url)
+            if cache[0].exists():
+                headers["If-None-Match"] = cache[1].read_text(encoding="utf-8")
+        except OSError:
+            pass
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            resp = _request(url, headers)
+            break
+        except (OSError, http.client.HTTPException) as e:
+            if attempt == HTTP_RETRIES or isinstance(e, HTTP_NO_RETRY_ERRORS):
+                raise RuntimeError(
+                    f"Помилка мережі при завантаженні URL: {e}"
+                ) from e
+            time.sleep(HTTP_RETRY_BACKOFF * 2 ** attempt)
+    if resp.status == 304 and cache is not None and headers:
+        resp.read()  # empty; leaves the connection reusable
+        resp.close()
+        try:
+            return open(cache[0], "rb")
+        except OSError:
+            return _open_url(url, use_cache=False)
+    if not 200 <= resp.status < 300:
+        resp.close()
+        raise RuntimeError(f"HTTP помилка {resp.status} при завантаженні URL: {url}")
+    body: IO[bytes] = resp
+    if resp.headers.get("Content-Encoding", "").lower() == "gzip":
+        body = _GzipResponse(resp)
+    etag = resp.headers.get("ETag")
+    if cache is not None and etag:
+        return _save_to_cache(url, body, etag, *cache)
+    return body
 
-    converted = 0
-    for place in data:
-        wpt_xml = _make_wpt(place, cfg, base_url)
-        if wpt_xml:
-            gpx_parts.append(wpt_xml)
-            converted += 1
 
-    gpx_parts.append("</gpx>")
+def _fetch_url(url: str, use_cache: bool = True) -> bytes:
+    """Downloads the whole (inflated) body of a URL."""
+    with _open_url(url, use_cache) as resp:
+        return resp.read()
 
-    with open(output_gpx_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(gpx_parts))
+
+def _parse_items(body: bytes) -> List[Dict[str, Any]]:
+    """Parses an in-memory JSON document (orjson if installed) into items."""
+    return _extract_items(_json_loads(body))
+
+
+def _iter_items(fp: IO[bytes], eager: bool = False) -> Iterator[Dict[str, Any]]:
+    """Returns an iterator over items of a binary JSON stream; closes fp.
+
+    With ijson installed (and eager not set) the items are parsed lazily;
+    otherwise the raw bytes are read and parsed at once.
+    """
+    if ijson is not None and not eager:
+        return _iter_items_stream(fp)
+    with fp:
+        return iter(_parse_items(fp.read()))
+
+
+def _load_data(
+    input_json_file: str,
+    input_urls: Sequence[str],
+    use_cache: bool = True,
+    eager: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """Loads data from a file or URLs and returns an iterator over items.
+
+    A file or a single URL is opened right away (so missing files and network
+    errors are raised here) and parsed as it is read, unless ``eager`` asks
+    for whole-document parsing. Several URLs are downloaded concurrently;
+    the bodies are already in memory, so each is parsed at once, one after
+    another in the given order.
+    """
+    if not input_urls:
+        return _iter_items(open(input_json_file, "rb"), eager)
+    if len(input_urls) == 1:
+        return _iter_items(_open_url(input_urls[0], use_cache), eager)
+
+    workers = min(MAX_FETCH_WORKERS, len(input_urls))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetch = functools.partial(_fetch_url, use_cache=use_cache)
+        bodies = list(executor.map(fetch, input_urls))
+    return itertools.chain.from_iterable(map(_parse_items, bodies))
+
+
+# Source of the generated waypoint writer (see _compile_make_wpt). Each
+# snippet renders one optional element into a *_xml local ("" when absent);
+# the tail writes the whole <wpt> at once through a template whose slots
+# depend on the run settings. The writer returns False if lat/lon are missing.
+_WPT_SRC_HEAD = '''
+def make_wpt(
+    place,
+    write,
+    _escape=_escape,
+    _esc_attr=_esc_attr,
+    _ext_block=_ext_block,
+    DEFAULT_EXT_BLOCK=DEFAULT_EXT_BLOCK,
+    group_type_xml=group_type_xml,
+    base_url=base_url,
+):
+    get = place.get
+    lat, lon = get("latitude"), get("longitude")
+    if lat is None or lon is None:
+        return False
+    kind = get("kind")
+
+    sealevel = get("sealevel")
+    ele_xml = (
+        f"    <ele>{sealevel}</ele>\\n" if sealevel is not None and sealevel != "" else ""
+    )
+    whenadded = get("whenadded")
+    time_xml = (
+        f'    <time>{whenadded.replace(" ", "T")}Z</time>\\n' if whenadded else ""
+    )
+    title = get("title")
+    name_xml = f"    <name>{_escape(title)}</name>\\n" if title else ""
+    description = get("description")
+    desc_xml = f"    <desc>{_escape(description)}</desc>\\n" if description else ""
+'''
+_WPT_SRC_KIND_TYPE = '''
+    type_xml = f"    <type>{_escape(kind)}</type>\\n" if kind else ""
+'''
+_WPT_SRC_LINK = '''
+    viewurl = get("viewurl")
+    link_xml = (
+        f'    <link href="{_esc_attr(base_url + viewurl)}">'
+        "<text>Детальніше</text></link>\\n"
+        if viewurl
+        else ""
+    )
+'''
+_WPT_SRC_OSMAND = '''
+    ext_xml = _ext_block(kind, DEFAULT_EXT_BLOCK)
+'''
+_WPT_SRC_TAIL = '''
+    write(f'  <wpt lat="{lat}" lon="{lon}">\\n%s  </wpt>\\n')
+    return True
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_make_wpt(
+    use_osmand: bool, group_type_xml: Optional[str], base_url: str
+) -> Callable[[Dict[str, Any], Callable[[str], Any]], bool]:
+    """Generate a waypoint writer specialized for one run's settings.
+
+    Returns make_wpt(place, write) -> bool, which writes a GPX <wpt> element
+    for a single place. Uses fields: latitude, longitude (required),
+    sealevel-><ele>, whenadded-><time>, title-><name>, description-><desc>,
+    kind-><type> (or the pre-rendered ``group_type_xml`` line when a single
+    group name is used), viewurl-><link> (with base_url). With
+    ``use_osmand`` adds icon/color/background inside <extensions>.
+
+    The single-group and OsmAnd branches are resolved here, so the generated
+    code contains only what this configuration needs, and each waypoint is
+    rendered by one template and written with a single call. Helpers and run
+    constants are bound as default arguments (local lookups in the hot loop).
+    """
+    parts = [_WPT_SRC_HEAD]
+    slots = ["ele_xml", "time_xml", "name_xml", "desc_xml"]
+    if group_type_xml is not None:
+        slots.append("group_type_xml")
+    else:
+        parts.append(_WPT_SRC_KIND_TYPE)
+        slots.append("type_xml")
+    parts.append(_WPT_SRC_LINK)
+    slots.append("link_xml")
+    if use_osmand:
+        parts.append(_WPT_SRC_OSMAND)
+        slots.append("ext_xml")
+    parts.append(_WPT_SRC_TAIL % "".join(f"{{{slot}}}" for slot in slots))
+    namespace: Dict[str, Any] = {
+        "_escape": _esc,
+        "_esc_attr": _esc_attr,
+        "_ext_block": KIND_TO_EXT_BLOCK.get,
+        "DEFAULT_EXT_BLOCK": DEFAULT_EXT_BLOCK,
+        "group_type_xml": group_type_xml,
+        "base_url": base_url,
+    }
+    exec(compile("".join(parts), "<make_wpt>", "exec"), namespace)
+    return namespace["make_wpt"]
+
+
+def convert_places_to_gpx(cfg: Config) -> int:
+    """Converts data from a file or URL to GPX. Returns the number of converted points.
+
+    Waypoints are streamed into a buffered temp file as they are built; the
+    output file is replaced atomically once the GPX document is complete.
+    """
+    base_url = cfg.base_url.rstrip("/")
+    # Loop-invariant settings, resolved once per run.
+    use_osmand = cfg.use_osmand_tags
+    group_type_xml = (
+        f"    <type>{_esc(cfg.group_name)}</type>\n"
+        if cfg.use_single_group_name and cfg.group_name
+        else None
+    )
+
+    data = _load_data(
+        cfg.input_json,
+        cfg.input_urls,
+        use_cache=cfg.use_cache,
+        eager=cfg.eager,
+    )
+    make_wpt = _compile_make_wpt(use_osmand, group_type_xml, base_url)
+
+    # Write to a temp file next to the output and move it into place only when
+    # the document is complete, so a parse or network error mid-stream never
+    # leaves a truncated GPX (or destroys an existing one). A symlinked output
+    # path is resolved, so the link's target is replaced and the link is kept.
+    out_path = os.path.realpath(cfg.output_gpx)
+    out_dir = os.path.dirname(out_path)
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=out_dir, prefix=".", suffix=".gpx.tmp")
+    except FileNotFoundError as e:
+        e.filename = cfg.output_gpx  # report the output path, not the temp name
+        raise
+    converted = 0
+    try:
+        with open(fd, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as f:
+            write = f.write
+            write(_make_gpx_header(use_osmand))
+            write("\n")
+            for place in data:
+                if make_wpt(place, write):
+                    converted += 1
+            write("</gpx>\n")
+        # mkstemp creates the file as 0600: keep the mode of an existing
+        # output, otherwise use the usual umask-based one.
+        try:
+            mode = stat.S_IMODE(os.stat(out_path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_name, mode)
+        os.replace(tmp_name, out_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
 
     return converted
 
@@ -302,7 +890,7 @@ def main() -> int:
         cfg = build_config_from_env_and_args()
 
         # Validate data source: file or URL
-        if bool(cfg.get("input_json")) and bool(cfg.get("input_url")):
+        if cfg.input_json and cfg.input_urls:
             print(
                 "🚨 Помилка: виберіть лише одне джерело — файл (-i/--input) АБО URL (-u/--url).",
                 file=sys.stderr,
@@ -310,20 +898,20 @@ def main() -> int:
             return 2
 
         # Informational message about the selected data source
-        if cfg.get("input_url"):
-            print(f"Джерело: URL -> {cfg['input_url']}")
+        if cfg.input_urls:
+            print(f"Джерело: URL -> {', '.join(cfg.input_urls)}")
         else:
-            print(f"Джерело: файл -> {cfg['input_json']}")
+            print(f"Джерело: файл -> {cfg.input_json}")
 
         count = convert_places_to_gpx(cfg)
-        print(f"✅ Успішно! Створено файл: {cfg['output_gpx']}")
+        print(f"✅ Успішно! Створено файл: {cfg.output_gpx}")
         print(f"Конвертовано {count} точок.")
         return 0
     except FileNotFoundError as e:
         missing = getattr(e, "filename", "") or "вхідний файл"
         print(f"🚨 Помилка: файл '{missing}' не знайдено.", file=sys.stderr)
         return 1
-    except json.JSONDecodeError as e:
+    except JSON_ERRORS as e:
         print(
             f"🚨 Помилка: Неправильний формат JSON у файлі: {e}",
             file=sys.stderr,